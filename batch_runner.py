@@ -0,0 +1,216 @@
+"""
+Runs the full reminder process for many businesses at once. Each business (tenant) has its own directory under the
+tenants directory holding a tenant.json config file, which names its databases and message template and holds its
+email settings. For example:
+
+    {
+        "db": "db.json",
+        "archive": "fully_contacted_clients_archive",
+        "message": "message.txt",
+        "sender name": "Business owner name",
+        "contact number": "123-456-7890",
+        "sender email": "owner@business.com",
+        "sender password": "**********",
+        "host address": "smtp.gmail.com",
+        "port number": 465,
+        "smtp connections": 2,
+        "messages per minute": 60
+    }
+
+File paths are relative to the tenant's directory. Each tenant is run in its own process: clients due to be contacted
+are selected, their emails are rendered and sent over up to 'smtp connections' connections at no more than
+'messages per minute', then emailed clients are updated and fully contacted clients are archived. A report of how long
+each step took for each tenant is printed at the end.
+
+    python batch_runner.py --tenants tenants --workers 4
+"""
+
+import argparse
+import json
+import os
+import smtplib
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from client import Client
+from client_reminder_scheduler import (get_clients_to_be_reactivated, remove_fully_contacted_clients,
+                                       update_only_emailed_clients)
+from manage_email import render_messages
+
+config_name = "tenant.json"
+default_tenants_directory = "tenants"
+tenant_defaults = {"db": "db.json",
+                   "archive": "fully_contacted_clients_archive",
+                   "message": "message.txt",
+                   "smtp connections": 1,
+                   "messages per minute": 0
+                   }
+steps = ("select", "render", "send", "update", "archive")
+
+
+class RateLimiter:
+    """Spaces out calls to wait() across threads so no more than the given number happen per minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def discover_tenants(directory=default_tenants_directory) -> List[str]:
+    """Returns the directory of every tenant, which is each subdirectory containing a tenant.json file."""
+
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if os.path.isfile(os.path.join(directory, name, config_name)))
+
+
+def load_tenant(directory: str) -> dict:
+    """Returns a tenant's config with defaults filled in and file paths made absolute."""
+
+    with open(os.path.join(directory, config_name), "r") as rf:
+        tenant = dict(tenant_defaults, **json.load(rf))
+    for key in ("db", "archive", "message"):
+        tenant[key] = os.path.abspath(os.path.join(directory, tenant[key]))
+    tenant["name"] = os.path.basename(os.path.normpath(directory))
+    return tenant
+
+
+def _send_batch(tenant: dict, batch: List[Tuple[Client, bytes]],
+                limiter: RateLimiter) -> Tuple[List[Client], Optional[str]]:
+    """Sends a batch of messages over one connection. Returns the clients emailed and any error which stopped it."""
+
+    sent = []
+    try:
+        server = smtplib.SMTP_SSL(tenant["host address"], tenant["port number"])
+        try:
+            server.ehlo()
+            server.login(tenant["sender email"], tenant["sender password"])
+            for client, msg in batch:
+                limiter.wait()
+                server.sendmail(tenant["sender email"], client.get_email(), msg)
+                sent.append(client)
+        finally:
+            server.close()
+    except (OSError, smtplib.SMTPException) as e:
+        return sent, "{}: {}".format(type(e).__name__, e)
+    return sent, None
+
+
+def send_messages(tenant: dict, recipients: List[Client],
+                  msg_list: List[bytes]) -> Tuple[List[Client], List[str]]:
+    """Sends each recipient their message, spreading them over the tenant's connections and honoring its rate limit.
+    Returns the clients emailed and any errors."""
+
+    pairs = list(zip(recipients, msg_list))
+    connections = max(1, min(tenant["smtp connections"], len(pairs)))
+    limiter = RateLimiter(tenant["messages per minute"])
+    sent, errors = [], []
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        for batch_sent, error in executor.map(lambda batch: _send_batch(tenant, batch, limiter),
+                                              [pairs[i::connections] for i in range(connections)]):
+            sent.extend(batch_sent)
+            if error:
+                errors.append(error)
+    return sent, errors
+
+
+def run_tenant(directory: str, dry_run=False) -> Dict[str, object]:
+    """
+    Runs the full reminder process for one tenant, returning how many clients were due and emailed, any errors, and
+    the seconds taken by each step. A dry run selects and renders emails without sending them or changing databases.
+    """
+
+    report = {"tenant": os.path.basename(os.path.normpath(directory)), "due": 0, "emailed": 0, "errors": [],
+              "seconds": {}}
+    start = time.perf_counter()
+    try:
+        tenant = load_tenant(directory)
+        due = get_clients_to_be_reactivated(file=tenant["db"])
+        recipients = [client for client in due if client.get_email()]
+        report["due"] = len(due)
+        report["seconds"]["select"] = time.perf_counter() - start
+
+        step_start = time.perf_counter()
+        msg_list = render_messages(recipients, tenant["contact number"], tenant["sender name"],
+                                   template_file=tenant["message"], from_email=tenant["sender email"])
+        report["seconds"]["render"] = time.perf_counter() - step_start
+
+        if not dry_run and recipients:
+            step_start = time.perf_counter()
+            sent, report["errors"] = send_messages(tenant, recipients, msg_list)
+            report["emailed"] = len(sent)
+            report["seconds"]["send"] = time.perf_counter() - step_start
+
+            step_start = time.perf_counter()
+            update_only_emailed_clients(sent, file=tenant["db"])
+            report["seconds"]["update"] = time.perf_counter() - step_start
+
+            step_start = time.perf_counter()
+            remove_fully_contacted_clients(infile=tenant["db"], outfile=tenant["archive"])
+            report["seconds"]["archive"] = time.perf_counter() - step_start
+    except Exception as e:
+        report["errors"].append("{}: {}".format(type(e).__name__, e))
+    report["seconds"]["total"] = time.perf_counter() - start
+    return report
+
+
+def run_all_tenants(directory=default_tenants_directory, workers=None, dry_run=False) -> List[Dict[str, object]]:
+    """Runs every tenant found in the tenants directory in a pool of processes and returns their reports."""
+
+    tenants = discover_tenants(directory)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_tenant, tenants, [dry_run] * len(tenants)))
+
+
+def format_report(reports: List[Dict[str, object]], seconds: float) -> str:
+    """Returns a table of each tenant's client counts and step timings, followed by any errors."""
+
+    header = "{:<20}{:>8}{:>8}".format("Tenant", "Due", "Emailed") \
+             + "".join("{:>10}".format(step.capitalize()) for step in steps + ("total",))
+    lines = [header, "-" * len(header)]
+    for report in reports:
+        lines.append("{:<20}{:>8}{:>8}".format(report["tenant"], report["due"], report["emailed"])
+                     + "".join("{:>10}".format("{:.3f}".format(report["seconds"][step])
+                                               if step in report["seconds"] else "-")
+                               for step in steps + ("total",)))
+    lines.append("-" * len(header))
+    lines.append("{:<20}{:>8}{:>8}".format("All tenants", sum(report["due"] for report in reports),
+                                           sum(report["emailed"] for report in reports))
+                 + " " * 10 * len(steps) + "{:>10.3f}".format(seconds))
+    for report in reports:
+        for error in report["errors"]:
+            lines.append("{}: {}".format(report["tenant"], error))
+    return "\n".join(lines)
+
+
+def get_args(args: List[str]) -> argparse.Namespace:
+    """Gets the batch settings through the command line."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=str, default=default_tenants_directory,
+                        help="Directory holding a subdirectory for each tenant.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of tenants to run at once.")
+    parser.add_argument("--dry_run", action="store_true", help="Select and render emails without sending them.")
+    return parser.parse_args(args)
+
+
+def main():
+    args = get_args(sys.argv[1:])
+    start = time.perf_counter()
+    reports = run_all_tenants(args.tenants, args.workers, args.dry_run)
+    print(format_report(reports, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
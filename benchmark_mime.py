@@ -0,0 +1,83 @@
+"""
+Compares rendering reminder emails with create_message and send_message's serialization against rendering them with a
+MessageSkeleton, and checks that both produce exactly the same bytes for every recipient.
+
+    python benchmark_mime.py --recipients 20000
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from email.utils import make_msgid
+from typing import Dict, List
+
+from client import Client
+from manage_email import MessageSkeleton, create_message, flatten_message, message_id_domain
+
+
+def make_recipients(count: int) -> List[Client]:
+    """Returns made up recipients, a few of whom have names or addresses which cannot be spliced into a skeleton."""
+
+    recipients = []
+    for i in range(count):
+        first_name = random.choice(("Jim", "Mary", "Humpty", "Frodo")) \
+                     + "".join(random.choice(string.ascii_lowercase) for _ in range(3))
+        if i % 50 == 1:
+            first_name = "José"
+        elif i % 75 == 2:
+            first_name = "From Bob"
+        email = "{}.{}@example.com".format(first_name.lower().replace(" ", ""), i) if i % 100 else \
+            "x" * 80 + "@example.com"
+        recipients.append(Client(first_name, "Smith", "1/1/2018", "1/1/2019", email))
+    return recipients
+
+
+def run_benchmark(recipients: List[Client], template_file="message.txt") -> Dict[str, object]:
+    """Renders every recipient's email both ways, returning the seconds each took and how many emails matched."""
+
+    start = time.perf_counter()
+    msg_list = create_message(recipients, "123-456-7890", "Business owner name", template_file)
+    for msg in msg_list:
+        flatten_message(msg)
+    slow_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    skeleton = MessageSkeleton("123-456-7890", "Business owner name", template_file)
+    message_ids = [make_msgid(domain=message_id_domain()) for _ in recipients]
+    fast = [skeleton.render(recipient, message_id) for recipient, message_id in zip(recipients, message_ids)]
+    fast_seconds = time.perf_counter() - start
+
+    # Give the slow path's messages the skeleton's boundary and Message-IDs so the bytes can be compared
+    for msg, message_id in zip(msg_list, message_ids):
+        msg.set_boundary(skeleton.boundary)
+        msg.replace_header("Message-ID", message_id)
+    matched = sum(flatten_message(msg) == rendered for msg, rendered in zip(msg_list, fast))
+    return {"emails": len(recipients),
+            "matching emails": matched,
+            "create_message seconds": round(slow_seconds, 3),
+            "skeleton seconds": round(fast_seconds, 3),
+            "speedup": round(slow_seconds / fast_seconds, 1) if fast_seconds else None
+            }
+
+
+def get_args(args: List[str]) -> argparse.Namespace:
+    """Gets the benchmark settings through the command line."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=10000, help="Number of emails to render.")
+    parser.add_argument("--template", type=str, default="message.txt", help="Message template to render.")
+    return parser.parse_args(args)
+
+
+def main():
+    args = get_args(sys.argv[1:])
+    result = run_benchmark(make_recipients(args.recipients), args.template)
+    for key, value in result.items():
+        print("{}: {}".format(key, value))
+    print("Output matches byte for byte." if result["matching emails"] == result["emails"] else "Output differs!")
+
+
+if __name__ == "__main__":
+    main()
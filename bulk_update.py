@@ -0,0 +1,115 @@
+"""
+Applies changes to every client matching a filter in a single pass over the database and a single write.
+
+A ClientFilter combines conditions on reminder date, times contacted and email into one test. Reminder dates are
+compared as day numbers, so each distinct date string is only parsed once. Changes are given as a list of tinydb
+operations, for example:
+
+    >>> from tinydb.operations import add, set as set_val
+    >>> bulk_update(ClientFilter(rem_date_to=datetime.date(2018, 12, 31), max_times_contacted=0),
+    ...             [add("times contacted", 1), set_val("rem date", "1/1/2019")], file="db.json")  # doctest: +SKIP
+    {'scanned': 120, 'matched': 14, 'seconds': 0.004, 'dry run': False}
+"""
+
+import datetime
+import functools
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+from locked_storage import locked_db, snapshot_db
+from query_cache import invalidates_cache
+
+
+@functools.lru_cache(maxsize=4096)
+def date_ordinal(date: str) -> Optional[int]:
+    """
+    Returns the day number of a date in mm/dd/yyyy string format, or None if it is not a date.
+
+    >>> date_ordinal("3/4/2018") == datetime.date(2018, 3, 4).toordinal()
+    True
+    """
+    try:
+        month, day, year = date.replace("-", "/").split("/")
+        if len(year) == 2:  # Convert two digit date to four digit date
+            year = str(datetime.datetime.now().year)[:2] + year
+        return datetime.date(int(year), int(month), int(day)).toordinal()
+    except (AttributeError, ValueError):
+        return None
+
+
+def _as_ordinal(date: Union[datetime.date, str, None]) -> Optional[int]:
+    if date is None:
+        return None
+    if isinstance(date, datetime.date):
+        return date.toordinal()
+    ordinal = date_ordinal(date)
+    if ordinal is None:
+        raise ValueError("Date is not correctly formatted: {}".format(date))
+    return ordinal
+
+
+class ClientFilter:
+    """
+    Matches clients whose reminder date falls between rem_date_from and rem_date_to (both inclusive), whose times
+    contacted is between min_times_contacted and max_times_contacted (both inclusive), and who do or do not have an
+    email. Conditions left as None are not checked. Clients whose reminder date cannot be read never match a date
+    condition.
+    """
+
+    def __init__(self, rem_date_from=None, rem_date_to=None,
+                 min_times_contacted: int = None, max_times_contacted: int = None,
+                 has_email: bool = None):
+        self.rem_date_from = _as_ordinal(rem_date_from)
+        self.rem_date_to = _as_ordinal(rem_date_to)
+        self.min_times_contacted = min_times_contacted
+        self.max_times_contacted = max_times_contacted
+        self.has_email = has_email
+
+    def __call__(self, client: dict) -> bool:
+        if self.has_email is not None and bool(client.get("email")) != self.has_email:
+            return False
+        times_contacted = client.get("times contacted", 0)
+        if self.min_times_contacted is not None and times_contacted < self.min_times_contacted:
+            return False
+        if self.max_times_contacted is not None and times_contacted > self.max_times_contacted:
+            return False
+        if self.rem_date_from is not None or self.rem_date_to is not None:
+            ordinal = date_ordinal(client.get("rem date"))
+            if ordinal is None:
+                return False
+            if self.rem_date_from is not None and ordinal < self.rem_date_from:
+                return False
+            if self.rem_date_to is not None and ordinal > self.rem_date_to:
+                return False
+        return True
+
+
+@invalidates_cache("file")
+def bulk_update(client_filter: Callable[[dict], bool], operations: List[Callable[[dict], None]],
+                file="db.json", dry_run=False) -> Dict[str, object]:
+    """
+    Applies each operation in turn to every client matching the filter, reading and writing the database once.
+    Returns how many clients were scanned and matched and how long it took. A dry run only counts the clients
+    which would be changed, without taking the database's lock or writing to it.
+    """
+
+    start = time.perf_counter()
+    scanned = 0
+
+    def counting_filter(client: dict) -> bool:
+        nonlocal scanned
+        scanned += 1
+        return client_filter(client)
+
+    def apply(client: dict) -> None:
+        for operation in operations:
+            operation(client)
+
+    if dry_run:
+        with snapshot_db(file) as db:
+            matched = sum(1 for client in db.all() if counting_filter(client))
+    else:
+        with locked_db(file) as db:
+            matched = len(db.update(apply, counting_filter))
+    return {"scanned": scanned, "matched": matched, "seconds": round(time.perf_counter() - start, 6),
+            "dry run": dry_run}
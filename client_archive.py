@@ -0,0 +1,240 @@
+"""
+Stores fully contacted clients in an append-only archive of gzip compressed segments, each holding one client per
+line. A new segment is started each month or once the current segment grows past a size or client limit. A small
+index lists each segment's date range, client count and a filter of the client names it holds, so archiving a batch
+of clients only writes that batch, and looking up a client only reads the segments which may hold them.
+
+Run this module to convert the old fully_contacted_clients_db.json database into an archive or to look up a client:
+
+    python client_archive.py convert fully_contacted_clients_db.json
+    python client_archive.py find Jim Smith
+"""
+
+import argparse
+import datetime
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Tuple
+
+from locked_storage import atomic_write, file_lock, snapshot_db
+from manage_datetime import datetime_to_string
+
+default_directory = "fully_contacted_clients_archive"
+index_name = "index.json"
+max_segment_bytes = 1024 * 1024
+# Keeps each segment's name filter sparse enough that few lookups read a segment which does not hold the client
+max_segment_clients = 2000
+name_filter_bits = 16384
+name_filter_hashes = 3
+
+
+def _name_positions(first_name: str, last_name: str) -> List[int]:
+    """Returns the bits set in a segment's name filter for the given client."""
+
+    digest = hashlib.blake2b("{}\n{}".format(first_name.lower(), last_name.lower()).encode("utf-8")).digest()
+    return [int.from_bytes(digest[i * 4:i * 4 + 4], "big") % name_filter_bits for i in range(name_filter_hashes)]
+
+
+def _may_hold(segment: dict, first_name: str, last_name: str) -> bool:
+    """Returns false if the segment certainly does not hold the client, otherwise true."""
+
+    name_filter = int(segment["names"], 16)
+    return all(name_filter >> position & 1 for position in _name_positions(first_name, last_name))
+
+
+def read_index(directory=default_directory) -> List[Dict[str, object]]:
+    """Returns the list of segments in the order they were written."""
+
+    try:
+        with open(os.path.join(directory, index_name), "r") as rf:
+            return json.load(rf)["segments"]
+    except FileNotFoundError:
+        return []
+
+
+def _write_index(segments: List[Dict[str, object]], directory=default_directory) -> None:
+    atomic_write(os.path.join(directory, index_name), json.dumps({"segments": segments}, indent=2))
+
+
+def _new_segment(segments: List[Dict[str, object]], archived_on: datetime.date) -> Dict[str, object]:
+    """Returns an empty segment, numbered and with ids following on from the last segment."""
+
+    last = segments[-1] if segments else {"number": 0, "first id": 1, "clients": 0}
+    return {"number": last["number"] + 1,
+            "file": "segment-{:06d}.jsonl.gz".format(last["number"] + 1),
+            "month": archived_on.strftime("%Y-%m"),
+            # Dates in the index are ISO formatted so date ranges compare as strings
+            "first archived": archived_on.isoformat(),
+            "last archived": archived_on.isoformat(),
+            "first id": last["first id"] + last["clients"],
+            "clients": 0,
+            "bytes": 0,
+            "names": "0"
+            }
+
+
+def append_clients(clients: List[dict], directory=default_directory, archived_on=None) -> None:
+    """
+    Adds a batch of clients to the end of the archive, recording the date they were archived (today by default).
+    Only the current segment and the index are written.
+    """
+
+    archived_on = archived_on or datetime.date.today()
+    os.makedirs(directory, exist_ok=True)
+    for start in range(0, len(clients), max_segment_clients):
+        _append_batch(clients[start:start + max_segment_clients], directory, archived_on)
+
+
+def _segment_size(segment: Dict[str, object], directory=default_directory) -> int:
+    """Returns the size of a segment's file in bytes, or -1 if the file is missing."""
+
+    try:
+        return os.path.getsize(os.path.join(directory, segment["file"]))
+    except FileNotFoundError:
+        return -1
+
+
+def _append_batch(clients: List[dict], directory: str, archived_on: datetime.date) -> None:
+    """Adds a batch of clients which fits in one segment to the end of the archive."""
+
+    with file_lock(os.path.join(directory, index_name)):
+        segments = read_index(directory)
+        segment = segments[-1] if segments else None
+        if (segment is None or segment["month"] != archived_on.strftime("%Y-%m")
+                or segment["bytes"] >= max_segment_bytes
+                or segment["clients"] + len(clients) > max_segment_clients
+                # A segment which does not match its index entry was left by an interrupted append
+                or _segment_size(segment, directory) != segment["bytes"]):
+            segment = _new_segment(segments, archived_on)
+            segments.append(segment)
+            if os.path.exists(os.path.join(directory, segment["file"])):
+                os.remove(os.path.join(directory, segment["file"]))
+
+        name_filter = int(segment["names"], 16)
+        lines = []
+        for client in clients:
+            record = {"first name": client["first name"],
+                      "last name": client["last name"],
+                      "last visit": client["last visit"],
+                      "rem date": client["rem date"],
+                      "email": client["email"],
+                      "times contacted": client["times contacted"],
+                      "archived on": datetime_to_string(archived_on)
+                      }
+            lines.append(json.dumps(record) + "\n")
+            for position in _name_positions(client["first name"], client["last name"]):
+                name_filter |= 1 << position
+        path = os.path.join(directory, segment["file"])
+        with gzip.open(path, "at", encoding="utf-8") as wf:
+            wf.writelines(lines)
+
+        segment["clients"] += len(clients)
+        segment["bytes"] = os.path.getsize(path)
+        segment["names"] = format(name_filter, "x")
+        segment["first archived"] = min(segment["first archived"], archived_on.isoformat())
+        segment["last archived"] = max(segment["last archived"], archived_on.isoformat())
+        _write_index(segments, directory)
+
+
+def _read_segment(segment: Dict[str, object], directory=default_directory) -> Iterator[dict]:
+    """Yields the clients in a segment, ignoring any lines past those recorded in the index."""
+
+    with gzip.open(os.path.join(directory, segment["file"]), "rt", encoding="utf-8") as rf:
+        for _, line in zip(range(segment["clients"]), rf):
+            yield json.loads(line)
+
+
+def iter_archive(directory=default_directory, after_id=0) -> Iterator[Tuple[int, dict]]:
+    """Yields the id and contents of each archived client with an id greater than after_id, skipping older segments
+    without reading them."""
+
+    for segment in read_index(directory):
+        if segment["first id"] + segment["clients"] <= after_id + 1:
+            continue
+        for client_id, client in enumerate(_read_segment(segment, directory), start=segment["first id"]):
+            if client_id > after_id:
+                yield client_id, client
+
+
+def count_clients(directory=default_directory) -> int:
+    """Returns the number of archived clients."""
+
+    return sum(segment["clients"] for segment in read_index(directory))
+
+
+def find_archived_client(first_name: str, last_name: str, directory=default_directory) -> List[dict]:
+    """Returns every archived client matching the first and last name, each with the date it was archived on."""
+
+    result = []
+    for segment in read_index(directory):
+        if _may_hold(segment, first_name, last_name):
+            result.extend(client for client in _read_segment(segment, directory)
+                          if client["first name"].lower() == first_name.lower()
+                          and client["last name"].lower() == last_name.lower())
+    return result
+
+
+def convert_archive(infile="fully_contacted_clients_db.json", directory=default_directory, force=False) -> int:
+    """
+    Copies every client from a fully contacted client json database into the archive, returning the number copied.
+    The old database does not record when clients were archived, so each client's reminder date is used instead.
+    Converting into an archive which already holds clients would copy them twice, so it is refused unless forced.
+    """
+
+    if not force and count_clients(directory):
+        raise ValueError("Archive {} already holds clients, use --force to convert into it anyway".format(directory))
+
+    by_month = {}
+    with snapshot_db(infile) as db:
+        clients = db.all()
+    for client in clients:
+        archived_on = datetime.datetime.strptime(client["rem date"], "%m/%d/%Y").date()
+        by_month.setdefault(archived_on.strftime("%Y-%m"), []).append((archived_on, client))
+    for month in sorted(by_month):
+        clients = sorted(by_month[month], key=lambda item: item[0])
+        for archived_on, day in itertools.groupby(clients, key=lambda item: item[0]):
+            append_clients([client for _, client in day], directory, archived_on)
+    return sum(len(clients) for clients in by_month.values())
+
+
+def get_args(args: List[str]) -> argparse.Namespace:
+    """Gets the archive command through the command line."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directory", type=str, default=default_directory, help="Directory holding the archive.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    convert = commands.add_parser("convert", help="Copy a fully contacted client json database into the archive.")
+    convert.add_argument("infile", type=str, nargs="?", default="fully_contacted_clients_db.json",
+                         help="Json database to convert.")
+    convert.add_argument("--force", action="store_true", help="Convert even if the archive already holds clients.")
+    find = commands.add_parser("find", help="Show when a client was archived.")
+    find.add_argument("first_name", type=str, help="Client's first name.")
+    find.add_argument("last_name", type=str, help="Client's last name.")
+    return parser.parse_args(args)
+
+
+def main():
+    args = get_args(sys.argv[1:])
+    if args.command == "convert":
+        try:
+            copied = convert_archive(args.infile, args.directory, args.force)
+        except ValueError as e:
+            sys.exit(str(e))
+        print("Copied {} client(s) into {}".format(copied, args.directory))
+    else:
+        clients = find_archived_client(args.first_name, args.last_name, args.directory)
+        for client in clients:
+            print("{} {} was archived on {} after being contacted {} time(s)"
+                  .format(client["first name"], client["last name"], client["archived on"],
+                          client["times contacted"]))
+        if not clients:
+            print("No archived client found.")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,15 @@ import tkinter as tk
 from tkinter import messagebox
 from typing import List
 
-from tinydb import TinyDB, Query
+from tinydb import Query
 from tinydb.operations import add, set as set_val
 
+import client_archive
 from client import Client
+from locked_storage import locked_db, snapshot_db
 from manage_datetime import date_is_in_past, date_is_today, datetime_to_string, default_rem_date, string_to_datetime
-from manage_db import add_to_db
 from manage_email import send_email
+from query_cache import cached_query, invalidates_cache
 
 
 # TODO automatically schedule this task using Python
@@ -23,9 +25,10 @@ from manage_email import send_email
 remove_counter = 1
 
 
+@cached_query
 def get_clients_to_be_reactivated(file="db.json") -> List[Client]:
     """ Returns a list of clients who's reactivation date is today or in the past and should be contacted. """
-    with TinyDB(file) as db:
+    with snapshot_db(file) as db:
         query = Query()
         result = db.search(query["rem date"].test(contact_now))
         output = []
@@ -48,11 +51,12 @@ def contact_now(date: str) -> bool:
     return date_is_today(time_date) or date_is_in_past(time_date)
 
 
+@invalidates_cache("file")
 def update_only_emailed_clients(recipient_list, file="db.json") -> None:
     """Increments the 'times contacted' field for only clients that were just email reminders. Also,
     sets the reminder date for these clients to the default reminder date."""
 
-    with TinyDB(file) as db:
+    with locked_db(file) as db:
         for client in recipient_list:
             query = Query()
             db.update(add("times contacted", 1), (query["first name"].matches(client.get_first_name())
@@ -63,18 +67,16 @@ def update_only_emailed_clients(recipient_list, file="db.json") -> None:
                           )))
 
 
-def remove_fully_contacted_clients(infile="db.json", outfile="fully_contacted_clients_db.json") -> None:
+@invalidates_cache("infile")
+def remove_fully_contacted_clients(infile="db.json", outfile=client_archive.default_directory) -> None:
     """
     Removes clients from the database whose 'times contacted' field is greater than the number of times that
-    they should be contacted (remove_counter). It then stores those clients in the fully contacted client database.
+    they should be contacted (remove_counter). It then stores those clients in the fully contacted client archive.
     """
 
-    with TinyDB(infile) as db:
+    with locked_db(infile) as db:
         query = Query()
-        prev_contacted = db.search(query["times contacted"] > 1)
-        for client in prev_contacted:
-            add_to_db(client["first name"], client["last name"], client["last visit"],
-                      client["rem date"], client["email"], times_contacted=client["times contacted"], file=outfile)
+        client_archive.append_clients(db.search(query["times contacted"] > remove_counter), directory=outfile)
         db.remove(query["times contacted"] > remove_counter)
 
 
@@ -0,0 +1,318 @@
+"""
+Reports on the client and fully contacted client databases: contacts by reminder month, days from last visit to
+reminder, email coverage and archive growth.
+
+Databases are streamed one client at a time, so memory use does not grow with the size of the databases. Both TinyDB
+json files and line delimited json files (one client per line, ending in .jsonl) can be read, as well as the
+segmented archive in client_archive. Since the archive only ever grows, its totals are saved in a state file and only
+segments holding clients archived since the last report are read on the next run. An older fully contacted client
+database given as a json or .jsonl file is still decoded in full on every run, though only its new clients are added
+to the totals. The client database is always read in full as its clients change in place.
+
+    python client_report.py --db db.json --archive fully_contacted_clients_archive
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Tuple
+
+import client_archive
+from locked_storage import atomic_write
+
+default_state_file = "report_state.json"
+chunk_size = 64 * 1024
+growth_days = 30
+
+
+class _JsonStream:
+    """Reads a json file in chunks, decoding one value at a time."""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        """Reads the next chunk into the buffer, dropping what has been decoded. Returns false at the end of file."""
+
+        chunk = self.handle.read(chunk_size)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def peek(self) -> str:
+        """Returns the next character which is not whitespace, or an empty string at the end of file."""
+
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, characters: str) -> str:
+        """Consumes and returns the next character, which must be one of the given characters."""
+
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError("Expected one of {!r} at {!r}".format(characters, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+        return character
+
+    def decode(self):
+        """Decodes and returns the next json value, reading more of the file until the value is complete."""
+
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+
+def iter_documents(file: str, table="_default") -> Iterator[Tuple[int, dict]]:
+    """Yields the id and contents of each client in a database one at a time, without loading the whole file."""
+
+    with open(file, "r", encoding="utf-8") as rf:
+        if file.endswith(".jsonl"):
+            for doc_id, line in enumerate(rf, start=1):
+                if line.strip():
+                    yield doc_id, json.loads(line)
+            return
+        stream = _JsonStream(rf)
+        if not stream.peek():  # An empty file is an empty database
+            return
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            name = stream.decode()
+            stream.expect(":")
+            stream.expect("{")
+            if stream.peek() != "}":
+                while True:
+                    doc_id = stream.decode()
+                    stream.expect(":")
+                    document = stream.decode()
+                    if name == table:
+                        yield int(doc_id), document
+                    if stream.expect(",}") == "}":
+                        break
+            else:
+                stream.expect("}")
+            if stream.expect(",}") == "}":
+                return
+
+
+def _parse_date(date: str) -> datetime.date:
+    return datetime.datetime.strptime(date, "%m/%d/%Y").date()
+
+
+class RunningStats:
+    """Keeps the count, total, minimum and maximum of a series of numbers without storing them."""
+
+    def __init__(self, count=0, total=0, minimum=None, maximum=None):
+        self.count = count
+        self.total = total
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "total": self.total, "minimum": self.minimum, "maximum": self.maximum}
+
+
+class ClientStats:
+    """Aggregates reporting figures over clients, one client at a time."""
+
+    def __init__(self, clients=0, with_email=0, contacts_per_month=None, visit_to_reminder_days=None):
+        self.clients = clients
+        self.with_email = with_email
+        self.contacts_per_month = contacts_per_month or {}
+        self.visit_to_reminder_days = RunningStats(**(visit_to_reminder_days or {}))
+
+    def add(self, client: dict) -> None:
+        """
+        Adds one client's information to the figures. A client's contacts are counted under the month of their current
+        reminder date, which is reset after each contact, so this is not the month in which they were contacted.
+        """
+
+        self.clients += 1
+        if client.get("email"):
+            self.with_email += 1
+        try:
+            rem_date = _parse_date(client["rem date"])
+        except (KeyError, TypeError, ValueError):
+            return
+        month = "{:04d}-{:02d}".format(rem_date.year, rem_date.month)
+        self.contacts_per_month[month] = self.contacts_per_month.get(month, 0) + client.get("times contacted", 0)
+        try:
+            self.visit_to_reminder_days.add((rem_date - _parse_date(client["last visit"])).days)
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    def email_coverage(self) -> float:
+        return self.with_email / self.clients if self.clients else 0.0
+
+    def to_dict(self) -> dict:
+        return {"clients": self.clients,
+                "with_email": self.with_email,
+                "contacts_per_month": dict(sorted(self.contacts_per_month.items())),
+                "visit_to_reminder_days": self.visit_to_reminder_days.to_dict()
+                }
+
+
+def read_state(state_file=default_state_file) -> dict:
+    """Returns the archive totals saved by the last report, or an empty state if there has been none."""
+
+    try:
+        with open(state_file, "r") as rf:
+            return json.load(rf)
+    except FileNotFoundError:
+        return {}
+
+
+def archive_identity(archive: str) -> list:
+    """
+    Returns the absolute path of an archive along with what tells it apart from another archive at the same path:
+    the first segment's file and date for a segmented archive, or the first client of a json or .jsonl file. The
+    inode of a json file cannot be used, as every write replaces the file.
+    """
+
+    if os.path.isdir(archive):
+        segments = client_archive.read_index(archive)
+        return [os.path.abspath(archive), [segments[0]["file"], segments[0]["first archived"]] if segments else None]
+    return [os.path.abspath(archive), next((list(document) for document in iter_documents(archive)), None)]
+
+
+def update_archive_stats(archive: str, state: dict) -> Tuple[ClientStats, int]:
+    """
+    Adds clients archived since the last report to the saved archive totals. Returns the totals along with the
+    number of clients added. Only new segments of a segmented archive are read, while a json or .jsonl file is read in
+    full. The totals and growth are started afresh if the state belongs to another archive, and the totals are rebuilt
+    if the archive is found to have shrunk.
+    """
+
+    identity = archive_identity(archive)
+    if state.get("archive") != identity:
+        for key in ("aggregates", "last doc id", "growth"):
+            state.pop(key, None)
+        state["archive"] = identity
+    stats = ClientStats(**state.get("aggregates", {}))
+    last_id = state.get("last doc id", 0)
+    added = 0
+    if os.path.isdir(archive):
+        # Archived client ids run from one to the number of clients, and segments of counted clients are not read
+        seen = newest = client_archive.count_clients(archive)
+        if newest >= last_id:
+            for _, client in client_archive.iter_archive(archive, after_id=last_id):
+                stats.add(client)
+                added += 1
+    else:
+        seen, newest = 0, 0
+        for doc_id, client in iter_documents(archive):
+            seen += 1
+            newest = max(newest, doc_id)
+            if doc_id > last_id:
+                stats.add(client)
+                added += 1
+    if seen < stats.clients or newest < last_id:
+        del state["aggregates"], state["last doc id"]
+        return update_archive_stats(archive, state)
+    state["aggregates"] = stats.to_dict()
+    state["last doc id"] = newest
+    return stats, added
+
+
+def add_growth(growth: List[dict], clients: int, today=None) -> None:
+    """Records the number of archived clients for today, keeping one entry per day for the last growth_days days."""
+
+    today = (today or datetime.date.today()).isoformat()
+    if growth and growth[-1]["date"] == today:
+        growth.pop()
+    previous = growth[-1]["clients"] if growth else 0
+    growth.append({"date": today, "clients": clients, "added": clients - previous})
+    del growth[:-growth_days]
+
+
+def build_report(db="db.json", archive=client_archive.default_directory, state_file=default_state_file,
+                 full=False) -> Dict[str, object]:
+    """Streams over both databases once and returns the report, saving the archive totals for the next report."""
+
+    live = ClientStats()
+    if os.path.exists(db):
+        for _, client in iter_documents(db):
+            live.add(client)
+
+    state = read_state(state_file)
+    if full:
+        state.pop("aggregates", None)
+        state.pop("last doc id", None)
+    archived, _ = update_archive_stats(archive, state) if os.path.exists(archive) else (ClientStats(), 0)
+    growth = state.setdefault("growth", [])
+    add_growth(growth, archived.clients)
+    atomic_write(state_file, json.dumps(state, indent=2))
+
+    combined = ClientStats()
+    for month in set(live.contacts_per_month) | set(archived.contacts_per_month):
+        combined.contacts_per_month[month] = (live.contacts_per_month.get(month, 0)
+                                              + archived.contacts_per_month.get(month, 0))
+    return {"clients": live.to_dict(),
+            "archived clients": archived.to_dict(),
+            "contacts by reminder month": dict(sorted(combined.contacts_per_month.items())),
+            "mean days from last visit to reminder": round(live.visit_to_reminder_days.mean(), 1),
+            "email coverage": round(live.email_coverage(), 3),
+            "archive growth": growth
+            }
+
+
+def format_report(report: Dict[str, object]) -> str:
+    """Returns the report as readable text."""
+
+    lines = ["Clients: {}".format(report["clients"]["clients"]),
+             "Archived clients: {}".format(report["archived clients"]["clients"]),
+             "Email coverage: {:.1%}".format(report["email coverage"]),
+             "Mean days from last visit to reminder: {}".format(report["mean days from last visit to reminder"]),
+             "",
+             "Contacts by reminder month:"]
+    lines.extend("  {}  {}".format(month, count) for month, count in report["contacts by reminder month"].items())
+    lines.extend(["", "Archive growth:"])
+    lines.extend("  {}  {} clients (+{})".format(entry["date"], entry["clients"], entry["added"])
+                 for entry in report["archive growth"])
+    return "\n".join(lines)
+
+
+def get_args(args: List[str]) -> argparse.Namespace:
+    """Gets the databases to report on through the command line."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", type=str, default="db.json", help="Client database.")
+    parser.add_argument("--archive", type=str, default=client_archive.default_directory,
+                        help="Fully contacted client archive, or an older fully contacted client database.")
+    parser.add_argument("--state", type=str, default=default_state_file, help="Where archive totals are saved.")
+    parser.add_argument("--full", action="store_true", help="Recompute archive totals from scratch.")
+    return parser.parse_args(args)
+
+
+def main():
+    args = get_args(sys.argv[1:])
+    print(format_report(build_report(args.db, args.archive, args.state, args.full)))
+
+
+if __name__ == "__main__":
+    main()
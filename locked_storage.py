@@ -0,0 +1,105 @@
+"""
+Provides safe access to the json databases when several processes use them at once, such as a scheduled run of
+__main__.py alongside add_client.py or a bulk import.
+
+Writers hold an advisory lock on a '.lock' file next to the database for the whole read-modify-write, so concurrent
+updates are applied one after another instead of overwriting each other. Every write goes to a temporary file which
+is then renamed over the database, so readers never need the lock: they always see a complete snapshot of the
+database as of the last finished write.
+"""
+
+import json
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+
+from tinydb import TinyDB
+from tinydb.storages import Storage
+
+try:
+    import fcntl
+except ImportError:  # Advisory locks are unavailable on Windows, so writers are not serialized there
+    fcntl = None
+
+
+def atomic_write(path: str, content: str) -> None:
+    """Replaces the contents of a file in one step by writing to a temporary file and renaming it over the file."""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8") as wf:
+            wf.write(content)
+            wf.flush()
+            os.fsync(wf.fileno())
+        try:
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path: str):
+    """Holds an exclusive advisory lock for the given file until the block exits."""
+
+    with open(path + ".lock", "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class AtomicJSONStorage(Storage):
+    """A TinyDB storage which reads the database file afresh each time and writes to it with atomic_write."""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__()
+        self.path = path
+        self.kwargs = kwargs
+
+    def read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as rf:
+                content = rf.read()
+        except FileNotFoundError:
+            content = ""
+        # TinyDB writes an empty table back to a database which lacks one, so it is filled in here instead
+        data = json.loads(content) if content else {}
+        data.setdefault(TinyDB.DEFAULT_TABLE, {})
+        return data
+
+    def write(self, data) -> None:
+        atomic_write(self.path, json.dumps(data, **self.kwargs))
+
+
+class SnapshotJSONStorage(AtomicJSONStorage):
+    """A read-only TinyDB storage for readers which do not hold the lock, so they can never overwrite a writer's
+    change."""
+
+    def write(self, data) -> None:
+        raise IOError("Snapshot of {} is read only".format(self.path))
+
+
+@contextmanager
+def locked_db(file: str):
+    """Opens a database for updating, holding its lock so no other process can write to it until the block exits."""
+
+    with file_lock(file):
+        with TinyDB(file, storage=AtomicJSONStorage) as db:
+            yield db
+
+
+@contextmanager
+def snapshot_db(file: str):
+    """Opens a database for reading without taking its lock. The database cannot be written to through it."""
+
+    with TinyDB(file, storage=SnapshotJSONStorage) as db:
+        yield db
@@ -1,13 +1,19 @@
 """Provides helper functions to add to, search, update, and delete the contents of the database."""
 
+import datetime
 import re
+from typing import List
 
-from tinydb import TinyDB, Query
+from tinydb import Query
 from tinydb.operations import add, set as set_val
 
-from manage_datetime import datetime_to_string, is_rem_date_in_past, validate_date
+from bulk_update import ClientFilter, bulk_update
+from locked_storage import locked_db, snapshot_db
+from manage_datetime import datetime_to_string, validate_date
+from query_cache import cached_query, invalidates_cache
 
 
+@invalidates_cache("file")
 def add_to_db(first_name: str, last_name: str,
               last_visit: str,
               reminder_date: str,
@@ -17,7 +23,7 @@ def add_to_db(first_name: str, last_name: str,
               ) -> None:
     """Adds a client information to the json database."""
 
-    with TinyDB(file) as db:
+    with locked_db(file) as db:
         db.insert({"first name": first_name,
                    "last name": last_name,
                    "last visit": last_visit,
@@ -27,10 +33,25 @@ def add_to_db(first_name: str, last_name: str,
                    })
 
 
+@invalidates_cache("file")
+def add_clients_to_db(clients: List[dict], file='db.json') -> None:
+    """Adds many clients' information to the json database in a single write."""
+
+    with locked_db(file) as db:
+        db.insert_multiple({"first name": client["first name"],
+                            "last name": client["last name"],
+                            "last visit": client["last visit"],
+                            "rem date": client["rem date"],
+                            "email": client["email"],
+                            "times contacted": client["times contacted"]
+                            } for client in clients)
+
+
+@cached_query
 def get_client(first_name: str, last_name: str, file="db.json") -> list:
     """Returns a list containing client information from the database that matches the client's first and last name."""
 
-    with TinyDB(file) as db:
+    with snapshot_db(file) as db:
         query = Query()
         result = db.search(
             (query["first name"].matches(first_name, flags=re.IGNORECASE))
@@ -39,10 +60,11 @@ def get_client(first_name: str, last_name: str, file="db.json") -> list:
     return result
 
 
+@invalidates_cache("file")
 def delete_client(first_name: str, last_name: str, file="db.json") -> None:
     """Deletes all clients from the database which match the client's first and last name."""
 
-    with TinyDB(file) as db:
+    with locked_db(file) as db:
         query = Query()
         db.remove(
             (query["first name"].matches(first_name, flags=re.IGNORECASE))
@@ -50,20 +72,22 @@ def delete_client(first_name: str, last_name: str, file="db.json") -> None:
         )
 
 
+@invalidates_cache("file")
 def update_times_contacted(first_name: str, last_name: str, addition: int = 1, file="db.json") -> None:
     """Increments the 'times contacted' field in the database for all clients that match the first and last name."""
 
-    with TinyDB(file) as db:
+    with locked_db(file) as db:
         query = Query()
         db.update(add("times contacted", addition), (query["first name"].matches(first_name, flags=re.IGNORECASE))
                   & (query["last name"].matches(last_name, flags=re.IGNORECASE))
                   )
 
 
+@cached_query
 def get_times_contacted(first_name: str, last_name: str, file="db.json") -> int:
     """Returns the times a client has been contacted for clients that match the first and last name."""
 
-    with TinyDB(file) as db:
+    with snapshot_db(file) as db:
         query = Query()
         result = db.search((query["first name"].matches(first_name, flags=re.IGNORECASE))
                            & (query["last name"].matches(last_name, flags=re.IGNORECASE))
@@ -74,20 +98,21 @@ def get_times_contacted(first_name: str, last_name: str, file="db.json") -> int:
         return -1
 
 
+@invalidates_cache("file")
 def update_clients_with_rem_date_in_past(file="db.json") -> None:
     """Increments the 'times contacted' field for all clients with reminder dates in the past."""
 
-    with TinyDB(file) as db:
-        query = Query()
-        db.update(add("times contacted", 1), query["rem date"].test(is_rem_date_in_past))
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    bulk_update(ClientFilter(rem_date_to=yesterday), [add("times contacted", 1)], file=file)
 
 
+@invalidates_cache("file")
 def update_rem_date(first_name: str, last_name: str, date: str, file="db.json") -> None:
     """Verifies and sets the reminder date for a client matching the first and last name."""
 
     try:
         date = datetime_to_string(validate_date(date))
-        with TinyDB(file) as db:
+        with locked_db(file) as db:
             query = Query()
             db.update(set_val("rem date", date), (query["first name"].matches(first_name, flags=re.IGNORECASE))
                       & (query["last name"].matches(last_name, flags=re.IGNORECASE))
@@ -96,25 +121,27 @@ def update_rem_date(first_name: str, last_name: str, date: str, file="db.json")
         print("Date is not correctly formatted")
 
 
+@cached_query
 def get_all_db_contents(file="db.json") -> list:
     """Returns all clients from the database."""
 
-    with TinyDB(file) as db:
+    with snapshot_db(file) as db:
         return db.all()
 
 
+@invalidates_cache("file")
 def delete_db_contents(file="db.json") -> None:
     """Deletes all clients from the database."""
-    with TinyDB(file) as db:
+    with locked_db(file) as db:
         db.purge()
 
 
-def set_rem_date_for_all(date) -> None:
+@invalidates_cache("file")
+def set_rem_date_for_all(date, file="db.json") -> None:
     """Validates and sets the reminder date for all clients. Helpful for testing purposes."""
 
     try:
         date = datetime_to_string(validate_date(date))
-        with TinyDB("db.json") as db:
-            db.update({"rem date": date})
+        bulk_update(ClientFilter(), [set_val("rem date", date)], file=file)
     except ValueError:
         print("Date is not correctly formatted")
@@ -1,10 +1,19 @@
 """Use to send reminder emails to clients. Uses client's personal name in each email."""
 
+from email.generator import BytesGenerator
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.utils import make_msgid
+import functools
+from io import BytesIO
+import random
+import re
 import smtplib
+import socket
 from string import Template
-from typing import List
+import sys
+from typing import Dict, List, Optional
+import uuid
 
 from client import Client
 
@@ -42,28 +51,124 @@ def create_template(filename) -> Template:
     return Template(template_file_content)
 
 
-def create_message(recipient_list: List[Client], business_number: str, your_name: str) ->List[MIMEMultipart]:
+@functools.lru_cache(maxsize=None)
+def message_id_domain() -> str:
+    """Returns the domain used in Message-IDs, looking it up only once as the lookup can be slow."""
+
+    return socket.getfqdn()
+
+
+def _build_message(from_email: str, to_email: str, message: str, message_id: str) -> MIMEMultipart:
+    """Returns a reminder email with the given addresses, text and Message-ID."""
+
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = "We miss you!"
+    msg['Message-ID'] = message_id
+    msg.attach(MIMEText(message, 'plain'))
+    return msg
+
+
+def flatten_message(msg: MIMEMultipart) -> bytes:
+    """Returns the bytes of a message exactly as smtplib's send_message would send them."""
+
+    output = BytesIO()
+    BytesGenerator(output).flatten(msg, linesep='\r\n')
+    return output.getvalue()
+
+
+def create_message(recipient_list: List[Client], business_number: str, your_name: str,
+                   template_file='message.txt', from_email=sender_email) ->List[MIMEMultipart]:
     """
     Creates an email message text file. Returns a list of MIMEMultipart messages for each recipient with an email.
     Make sure to edit message.txt with your custom message.
     """
 
     msg_list = []
+    message_template = create_template(template_file)
     for recipient in recipient_list:
         if recipient.get_email():
-            message_template = create_template('message.txt')
-            msg = MIMEMultipart()
             message = message_template.substitute(
                 PERSON_NAME=recipient.get_first_name(),
                 PHONE=business_number, YOUR_NAME=your_name)
-            msg['From'] = sender_email
-            msg['To'] = recipient.get_email()
-            msg['Subject'] = "We miss you!"
-            msg.attach(MIMEText(message, 'plain'))
-            msg_list.append(msg)
+            msg_list.append(_build_message(from_email, recipient.get_email(), message,
+                                           make_msgid(domain=message_id_domain())))
     return msg_list
 
 
+class MessageSkeleton:
+    """
+    Renders reminder emails straight to bytes for many recipients of the same template and sender.
+
+    A message is built and serialized once with placeholder values, then split where the recipient's name, address
+    and Message-ID appear. Each email is rendered by joining the pieces with the recipient's values, skipping the
+    MIME objects and email generator entirely. Values which the generator would encode, fold or escape, such as
+    non-ASCII names or long addresses, are rendered the slow way instead, so the bytes always match what
+    create_message and send_message would produce with the same boundary and Message-ID.
+    """
+
+    max_header_length = 78
+    header_names = {"address": "To", "message id": "Message-ID"}
+
+    def __init__(self, business_number: str, your_name: str, template_file='message.txt', from_email=sender_email):
+        self.from_email = from_email
+        self.message_template = create_template(template_file)
+        self.business_number = business_number
+        self.your_name = your_name
+        # Formatted like the boundaries made by the email generator
+        self.boundary = "=" * 15 + "{:019d}".format(random.randrange(sys.maxsize)) + "=="
+        placeholders = {field: "X" + uuid.uuid4().hex[:12] for field in ("name", "address", "message id")}
+        skeleton = flatten_message(self.build(placeholders["name"], placeholders["address"],
+                                              placeholders["message id"]))
+        fields = {placeholder.encode("ascii"): field for field, placeholder in placeholders.items()}
+        pieces = re.split(b"(" + b"|".join(map(re.escape, fields)) + b")", skeleton)
+        self.pieces = [fields.get(piece, piece) for piece in pieces]
+        # A template which is itself encoded hides the placeholders, leaving only the slow way
+        if {piece for piece in self.pieces if isinstance(piece, str)} != set(placeholders):
+            self.pieces = None
+
+    def build(self, first_name: str, email: str, message_id: str) -> MIMEMultipart:
+        """Returns the message for one recipient as a MIMEMultipart, using this skeleton's boundary."""
+
+        message = self.message_template.substitute(PERSON_NAME=first_name, PHONE=self.business_number,
+                                                   YOUR_NAME=self.your_name)
+        msg = _build_message(self.from_email, email, message, message_id)
+        msg.set_boundary(self.boundary)
+        return msg
+
+    def _can_splice(self, values: Dict[str, str]) -> bool:
+        """Returns true if the generator would write every value into the message unchanged."""
+
+        for field, value in values.items():
+            if not value.isascii() or any(character in value for character in "\r\n"):
+                return False
+            if field in self.header_names and (any(character.isspace() for character in value)
+                                               or len(self.header_names[field]) + 2 + len(value)
+                                               > self.max_header_length):
+                return False
+        # The generator escapes body lines starting with 'From ', which a name could begin
+        return "From" not in values["name"]
+
+    def render(self, recipient: Client, message_id: Optional[str] = None) -> bytes:
+        """Returns the bytes of the email to a recipient, ready to be passed to smtplib's sendmail."""
+
+        message_id = message_id or make_msgid(domain=message_id_domain())
+        values = {"name": recipient.get_first_name(), "address": recipient.get_email(), "message id": message_id}
+        if self.pieces is None or not self._can_splice(values):
+            return flatten_message(self.build(recipient.get_first_name(), recipient.get_email(), message_id))
+        encoded = {field: value.encode("ascii") for field, value in values.items()}
+        return b"".join(encoded[piece] if isinstance(piece, str) else piece for piece in self.pieces)
+
+
+def render_messages(recipient_list: List[Client], business_number: str, your_name: str,
+                    template_file='message.txt', from_email=sender_email) -> List[bytes]:
+    """Returns the bytes of the email to each recipient with an email, rendered with a MessageSkeleton."""
+
+    skeleton = MessageSkeleton(business_number, your_name, template_file, from_email)
+    return [skeleton.render(recipient) for recipient in recipient_list if recipient.get_email()]
+
+
 def make_email_list(recipient_list: List[Client]) -> List[str]:
     """Returns an email list for all clients that have an email."""
 
@@ -75,12 +180,12 @@ def send_email(recipient_list: List[Client]) -> None:
 
     try:
         email_list = make_email_list(recipient_list)
-        msg_list = create_message(recipient_list, contact_number, sender_name)
+        msg_list = render_messages(recipient_list, contact_number, sender_name)
         server = smtplib.SMTP_SSL(host_address, port_number)
         server.ehlo()
         server.login(sender_email, sender_password)
-        for i in range(len(recipient_list)):
-            server.send_message(msg_list[i], sender_email, email_list[i])
+        for msg, email in zip(msg_list, email_list):
+            server.sendmail(sender_email, email, msg)
         server.close()
         print('Email(s) sent!')
     except:
@@ -0,0 +1,299 @@
+"""
+Provides an optional partitioned layout of the client database, with one json database per reminder date month
+listed in a small manifest. Queries for clients due to be contacted only read the partitions for past and current
+months, and writes only rewrite the partitions holding the affected clients.
+
+The helper functions mirror those in manage_db, but take the partition directory instead of a single database file.
+This is a library only: the reminder process in __main__.py, client_reminder_scheduler and batch_runner still reads
+and updates a single database file, so reminders cannot yet be sent from partitions.
+Run this module to split an existing database into partitions or to rebalance partitions after reminder dates change:
+
+    python partitioned_db.py split db.json
+    python partitioned_db.py rebalance
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List
+
+from tinydb import Query
+
+import manage_db
+from client import Client
+from client_reminder_scheduler import get_clients_to_be_reactivated
+from locked_storage import atomic_write, file_lock, locked_db
+from manage_datetime import datetime_to_string, string_to_datetime, validate_date
+from query_cache import query_cache
+
+default_directory = "db_partitions"
+manifest_name = "manifest.json"
+
+
+def partition_key(date: str) -> str:
+    """
+    Returns the name of the partition holding clients with the given reminder date.
+
+    >>> partition_key("3/4/2018")
+    '2018-03'
+    """
+    date = string_to_datetime(date)
+    return "{:04d}-{:02d}".format(date.year, date.month)
+
+
+def read_manifest(directory=default_directory) -> Dict[str, str]:
+    """Returns a dictionary mapping each partition name to its database file."""
+
+    try:
+        with open(os.path.join(directory, manifest_name), "r") as rf:
+            return json.load(rf)["partitions"]
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(partitions: Dict[str, str], directory=default_directory) -> None:
+    """Writes the partition names and their database files to the manifest."""
+
+    os.makedirs(directory, exist_ok=True)
+    atomic_write(os.path.join(directory, manifest_name),
+                 json.dumps({"layout": "rem date month", "partitions": dict(sorted(partitions.items()))}, indent=2))
+
+
+def partition_file(key: str, directory=default_directory) -> str:
+    """Returns the path of a partition's database file, adding the partition to the manifest if it is new."""
+
+    return _partition_files([key], directory)[key]
+
+
+def _partition_files(keys: Iterable[str], directory=default_directory) -> Dict[str, str]:
+    """Returns the path of each partition's database file, adding any new partitions to the manifest at once."""
+
+    partitions = read_manifest(directory)
+    if not set(keys) <= set(partitions):
+        os.makedirs(directory, exist_ok=True)
+        with file_lock(os.path.join(directory, manifest_name)):
+            partitions = read_manifest(directory)
+            for key in keys:
+                partitions.setdefault(key, key + ".json")
+            write_manifest(partitions, directory)
+    return {key: os.path.join(directory, partitions[key]) for key in keys}
+
+
+def add_clients(clients: List[dict], directory=default_directory) -> None:
+    """Adds many clients to the partitions for their reminder dates, writing each partition and the manifest once."""
+
+    by_partition = {}
+    for client in clients:
+        by_partition.setdefault(partition_key(client["rem date"]), []).append(client)
+    files = _partition_files(by_partition, directory)
+    for key, batch in by_partition.items():
+        manage_db.add_clients_to_db(batch, file=files[key])
+
+
+def partition_files(directory=default_directory, up_to=None) -> List[str]:
+    """Returns the database files of every partition, or only those up to and including the given partition name."""
+
+    return [os.path.join(directory, file) for key, file in sorted(read_manifest(directory).items())
+            if up_to is None or key <= up_to]
+
+
+def _files_containing(first_name: str, last_name: str, directory=default_directory) -> List[str]:
+    """Returns the database files of the partitions holding clients that match the first and last name."""
+
+    return [file for file in partition_files(directory) if manage_db.get_client(first_name, last_name, file=file)]
+
+
+def add_to_db(first_name: str, last_name: str,
+              last_visit: str,
+              reminder_date: str,
+              email=None,
+              times_contacted=0,
+              directory=default_directory
+              ) -> None:
+    """Adds client information to the partition for its reminder date."""
+
+    manage_db.add_to_db(first_name, last_name, last_visit, reminder_date, email, times_contacted,
+                        file=partition_file(partition_key(reminder_date), directory))
+
+
+def get_client(first_name: str, last_name: str, directory=default_directory) -> list:
+    """Returns a list containing client information from every partition that matches the first and last name."""
+
+    result = []
+    for file in partition_files(directory):
+        result.extend(manage_db.get_client(first_name, last_name, file=file))
+    return result
+
+
+def delete_client(first_name: str, last_name: str, directory=default_directory) -> None:
+    """Deletes all clients from the partitions which match the client's first and last name."""
+
+    for file in _files_containing(first_name, last_name, directory):
+        manage_db.delete_client(first_name, last_name, file=file)
+
+
+def update_times_contacted(first_name: str, last_name: str, addition: int = 1, directory=default_directory) -> None:
+    """Increments the 'times contacted' field for all clients in the partitions that match the first and last name."""
+
+    for file in _files_containing(first_name, last_name, directory):
+        manage_db.update_times_contacted(first_name, last_name, addition, file=file)
+
+
+def get_times_contacted(first_name: str, last_name: str, directory=default_directory) -> int:
+    """Returns the times a client has been contacted for clients that match the first and last name."""
+
+    for file in _files_containing(first_name, last_name, directory):
+        return manage_db.get_times_contacted(first_name, last_name, file=file)
+    return -1
+
+
+def update_clients_with_rem_date_in_past(directory=default_directory) -> None:
+    """Increments the 'times contacted' field for all clients with reminder dates in the past."""
+
+    for file in partition_files(directory, up_to=partition_key(datetime_to_string(datetime.datetime.now()))):
+        manage_db.update_clients_with_rem_date_in_past(file=file)
+
+
+def update_rem_date(first_name: str, last_name: str, date: str, directory=default_directory) -> None:
+    """Verifies and sets the reminder date for a client matching the first and last name, moving the client to the
+    partition for its new reminder date."""
+
+    try:
+        date = datetime_to_string(validate_date(date))
+    except AttributeError:
+        print("Date is not correctly formatted")
+        return
+    query = Query()
+    matches_name = ((query["first name"].matches(first_name, flags=re.IGNORECASE))
+                    & (query["last name"].matches(last_name, flags=re.IGNORECASE)))
+    for file in _files_containing(first_name, last_name, directory):
+        _move_clients(file, matches_name, date, directory)
+
+
+@contextmanager
+def _locked_pair(first: str, second: str):
+    """Opens two partitions for updating, taking their locks in a fixed order so two processes moving clients in
+    opposite directions cannot wait on each other."""
+
+    ordered = sorted((os.path.abspath(first), os.path.abspath(second)))
+    with locked_db(ordered[0]) as db_a, locked_db(ordered[1]) as db_b:
+        yield (db_a, db_b) if ordered[0] == os.path.abspath(first) else (db_b, db_a)
+
+
+def _move_clients(file: str, cond: Callable[[dict], bool], date: str, directory=default_directory) -> None:
+    """
+    Sets the reminder date of the clients in a partition matching the condition, moving them to the partition for
+    the new date. Both partitions stay locked from reading the clients to removing them, so no other process's change
+    is lost, and the clients are written to their new partition before they are removed from the old one.
+    """
+
+    target = partition_file(partition_key(date), directory)
+    if os.path.abspath(target) == os.path.abspath(file):
+        with locked_db(file) as db:
+            db.update({"rem date": date}, cond)
+    else:
+        with _locked_pair(file, target) as (db, target_db):
+            clients = db.search(cond)
+            if clients:
+                target_db.insert_multiple(dict(client, **{"rem date": date}) for client in clients)
+                db.remove(doc_ids=[client.doc_id for client in clients])
+        query_cache.invalidate(target)
+    query_cache.invalidate(file)
+
+
+def get_all_db_contents(directory=default_directory) -> list:
+    """Returns all clients from every partition."""
+
+    result = []
+    for file in partition_files(directory):
+        result.extend(manage_db.get_all_db_contents(file=file))
+    return result
+
+
+def delete_db_contents(directory=default_directory) -> None:
+    """Deletes all clients from every partition. The emptied partitions are kept, as another process may be adding
+    to them."""
+
+    for file in partition_files(directory):
+        manage_db.delete_db_contents(file=file)
+
+
+def set_rem_date_for_all(date, directory=default_directory) -> None:
+    """Validates and sets the reminder date for all clients, moving them into a single partition.
+    Helpful for testing purposes."""
+
+    try:
+        date = datetime_to_string(validate_date(date))
+    except ValueError:
+        print("Date is not correctly formatted")
+        return
+    for file in partition_files(directory):
+        _move_clients(file, lambda client: True, date, directory)
+
+
+def get_due_clients(directory=default_directory) -> List[Client]:
+    """Returns a list of clients who's reactivation date is today or in the past, only reading the partitions for
+    past and current months."""
+
+    output = []
+    for file in partition_files(directory, up_to=partition_key(datetime_to_string(datetime.datetime.now()))):
+        output.extend(get_clients_to_be_reactivated(file=file))
+    return output
+
+
+def rebalance(directory=default_directory) -> int:
+    """
+    Moves clients whose reminder date no longer belongs to their partition into the correct partition. Each
+    partition and the manifest are written at most twice. Returns the number of clients moved. Emptied partitions are
+    kept, as another process may be adding to them.
+    """
+
+    misplaced = []
+    for key, file in sorted(read_manifest(directory).items()):
+        path = os.path.join(directory, file)
+        with locked_db(path) as db:
+            clients = db.search(lambda client, key=key: partition_key(client["rem date"]) != key)
+            if clients:
+                db.remove(doc_ids=[client.doc_id for client in clients])
+        query_cache.invalidate(path)
+        misplaced.extend(clients)
+
+    add_clients(misplaced, directory)
+    return len(misplaced)
+
+
+def split_db(infile="db.json", directory=default_directory) -> int:
+    """Copies every client from a single json database into the partitioned layout. Returns the number copied."""
+
+    clients = manage_db.get_all_db_contents(file=infile)
+    add_clients(clients, directory)
+    return len(clients)
+
+
+def get_args(args: List[str]) -> argparse.Namespace:
+    """Gets the partition command through the command line."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directory", type=str, default=default_directory, help="Directory holding the partitions.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    split = commands.add_parser("split", help="Copy a single json database into partitions.")
+    split.add_argument("infile", type=str, nargs="?", default="db.json", help="Json database to split.")
+    commands.add_parser("rebalance", help="Move clients whose reminder date changed into the correct partition.")
+    return parser.parse_args(args)
+
+
+def main():
+    args = get_args(sys.argv[1:])
+    if args.command == "split":
+        print("Copied {} client(s) into {}".format(split_db(args.infile, args.directory), args.directory))
+    else:
+        print("Moved {} client(s) between partitions".format(rebalance(args.directory)))
+
+
+if __name__ == "__main__":
+    main()
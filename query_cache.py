@@ -0,0 +1,142 @@
+"""
+Caches the results of read queries against the json databases.
+
+A cached result is keyed on the database file's size, modification time and inode along with the query and the
+current date, so a result is only reused while the file is unchanged and the day has not rolled over. Writes made
+through the database helpers also invalidate every entry for the written file.
+"""
+
+import copy
+import datetime
+import functools
+import inspect
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from tinydb.database import Document
+
+default_max_entries = 128
+
+
+def db_fingerprint(file: str) -> Optional[Tuple[int, int, int]]:
+    """Returns the (size, mtime, inode) of a database file, or None if the file does not exist."""
+
+    try:
+        stat = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def copy_result(result):
+    """
+    Returns a copy of a query result which can be changed without changing the cached result. Clients only hold
+    strings and numbers, so each client in a list is copied on its own rather than deep copying the whole result.
+    """
+
+    if isinstance(result, list):
+        return [copy_result(item) for item in result]
+    if isinstance(result, Document):
+        return Document(dict(result), result.doc_id)
+    return copy.copy(result)
+
+
+class QueryCache:
+    """A bounded LRU cache of query results which keeps count of its hits and misses."""
+
+    def __init__(self, max_entries: int = default_max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable, default=None):
+        """Returns a copy of the cached result for the key and marks it as recently used."""
+
+        try:
+            result = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy_result(result)
+
+    def put(self, key: Hashable, result) -> None:
+        """Stores a copy of the result, evicting the least recently used entries when the cache is full."""
+
+        self._entries[key] = copy_result(result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, file: str) -> None:
+        """Drops every cached result that was read from the given database file."""
+
+        path = os.path.abspath(file)
+        for key in [key for key in self._entries if key[0] == path]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Drops every cached result and resets the hit and miss counters."""
+
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit and miss counters as well as the number of cached results."""
+
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+query_cache = QueryCache()
+
+
+def _bind(func: Callable, args: tuple, kwargs: dict) -> Dict[str, object]:
+    """Returns every argument passed to func, including defaults, by parameter name."""
+
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return bound.arguments
+
+
+def cached_query(func: Callable) -> Callable:
+    """Caches the results of a read function which takes a 'file' argument naming the database."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        arguments = _bind(func, args, kwargs)
+        file = arguments["file"]
+        arguments = tuple(sorted(arguments.items()))
+        key = (os.path.abspath(file), db_fingerprint(file), func.__qualname__, arguments, datetime.date.today())
+        result = query_cache.get(key, default=wrapper)
+        if result is wrapper:
+            # The fingerprint is taken before reading, so a write which lands mid-read can only cause a later miss
+            result = func(*args, **kwargs)
+            query_cache.put(key, result)
+        return result
+
+    return wrapper
+
+
+def invalidates_cache(*file_params: str) -> Callable:
+    """Drops cached results for the database files named by the given parameters of a function which writes to them."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            arguments = _bind(func, args, kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                for param in file_params:
+                    query_cache.invalidate(arguments[param])
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,109 @@
+"""
+Runs many writer and reader processes against one json database at the same time and checks that no update was lost
+and that every read saw a complete database. Use it to check the locking in locked_storage on a given machine:
+
+    python stress_test_db.py --writers 8 --readers 4 --clients 50
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, List
+
+from locked_storage import snapshot_db
+from manage_db import add_to_db, get_times_contacted, update_times_contacted
+
+shared_client = ("Shared", "Counter")
+
+
+def _write(file: str, writer: int, clients: int) -> None:
+    """Adds new clients to the database, also incrementing the shared client's contact count for each one."""
+
+    for i in range(clients):
+        add_to_db("Writer{}".format(writer), "Client{}".format(i), "1/1/2018", "1/1/2100", file=file)
+        update_times_contacted(*shared_client, file=file)
+
+
+def _read(file: str, stop, results) -> None:
+    """Reads the database until told to stop, counting reads and any snapshot that went backwards or failed."""
+
+    reads, errors, last_count = 0, 0, 0
+    while not stop.is_set():
+        try:
+            with snapshot_db(file) as db:
+                count = len(db.all())
+        except ValueError:  # Raised by the json module on a partially written file
+            errors += 1
+            continue
+        if count < last_count:
+            errors += 1
+        last_count = count
+        reads += 1
+    results.put((reads, errors))
+
+
+def run_stress_test(file="stress_test.json", writers=8, readers=4, clients=25) -> Dict[str, int]:
+    """
+    Runs the writer and reader processes against a fresh database, then returns how many clients and contacts were
+    expected, how many were found, and how many reads were made and failed.
+    """
+
+    for path in (file, file + ".lock"):
+        if os.path.exists(path):
+            os.remove(path)
+    add_to_db(*shared_client, "1/1/2018", "1/1/2100", file=file)
+
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    reader_processes = [multiprocessing.Process(target=_read, args=(file, stop, results)) for _ in range(readers)]
+    writer_processes = [multiprocessing.Process(target=_write, args=(file, writer, clients))
+                        for writer in range(writers)]
+    start = time.perf_counter()
+    for process in reader_processes + writer_processes:
+        process.start()
+    for process in writer_processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    read_results: List[tuple] = [results.get() for _ in reader_processes]
+    for process in reader_processes:
+        process.join()
+
+    with snapshot_db(file) as db:
+        found_clients = len(db.all()) - 1
+    return {"expected clients": writers * clients,
+            "found clients": found_clients,
+            "expected contacts": writers * clients,
+            "found contacts": get_times_contacted(*shared_client, file=file),
+            "reads": sum(reads for reads, _ in read_results),
+            "failed reads": sum(errors for _, errors in read_results),
+            "seconds": round(elapsed, 3)
+            }
+
+
+def get_args(args: List[str]) -> argparse.Namespace:
+    """Gets the stress test settings through the command line."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, default="stress_test.json", help="Scratch database to test against.")
+    parser.add_argument("--writers", type=int, default=8, help="Number of writer processes.")
+    parser.add_argument("--readers", type=int, default=4, help="Number of reader processes.")
+    parser.add_argument("--clients", type=int, default=25, help="Number of clients added by each writer.")
+    return parser.parse_args(args)
+
+
+def main():
+    args = get_args(sys.argv[1:])
+    result = run_stress_test(args.file, args.writers, args.readers, args.clients)
+    for key, value in result.items():
+        print("{}: {}".format(key, value))
+    lost = result["expected clients"] - result["found clients"] + result["expected contacts"] - result["found contacts"]
+    print("No updates were lost." if not lost and not result["failed reads"] else "Updates were lost!")
+    for path in (args.file, args.file + ".lock"):
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,40 @@
 import datetime
+import json
 import os
+import shutil
+import time
 import unittest
+from unittest import mock
+
+from tinydb.operations import add, set as set_val
 
 from add_bulk_clients import add_bulk_clients_to_db
 from add_client import get_args, write_to_db
+import batch_runner
+from benchmark_mime import make_recipients, run_benchmark
+from bulk_update import ClientFilter, bulk_update
+from client import Client
+import client_archive
+import client_report
+from client_reminder_scheduler import remove_fully_contacted_clients
 import custom_exceptions
+import locked_storage
 import manage_datetime
 from manage_datetime import default_rem_date
 import manage_db as mdb
+import manage_email
+import partitioned_db as pdb
+from query_cache import QueryCache, query_cache
+from stress_test_db import run_stress_test
+
+
+def remove_db(*files: str) -> None:
+    """Removes test databases along with the lock files written next to them."""
+
+    for file in files:
+        for path in (file, file + ".lock"):
+            if os.path.exists(path):
+                os.remove(path)
 
 
 class TestManageDatetime(unittest.TestCase):
@@ -98,7 +125,422 @@ class TestManageDb(unittest.TestCase):
         self.assertEqual(mdb.get_all_db_contents("test.json"), [])
 
     def tearDown(self):
-        os.remove("test.json")
+        remove_db("test.json")
+
+
+class TestBulkUpdate(unittest.TestCase):
+
+    def setUp(self):
+        mdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com", file="test.json")
+        mdb.add_to_db("Mary", "Lou", "3/6/2018", "11/6/2018", None, 2, file="test.json")
+        mdb.add_to_db("Humpty", "Dumpty", "5/13/2016", "12/21/2100", "humpty@dumpty.com", file="test.json")
+
+    def test_filter_conditions(self):
+        self.assertEqual(bulk_update(ClientFilter(rem_date_to="12/31/2018"), [], "test.json", dry_run=True)["matched"],
+                         1)
+        self.assertEqual(bulk_update(ClientFilter(rem_date_from=datetime.date(2019, 1, 1), has_email=True), [],
+                                     "test.json", dry_run=True)["matched"], 2)
+        self.assertEqual(bulk_update(ClientFilter(min_times_contacted=1), [], "test.json", dry_run=True)["matched"], 1)
+
+    def test_dry_run_does_not_write(self):
+        result = bulk_update(ClientFilter(), [add("times contacted", 1)], "test.json", dry_run=True)
+
+        self.assertEqual((result["scanned"], result["matched"], result["dry run"]), (3, 3, True))
+        self.assertEqual(mdb.get_times_contacted("Jim", "Smith", file="test.json"), 0)
+
+    def test_applies_every_operation(self):
+        result = bulk_update(ClientFilter(has_email=True, max_times_contacted=0),
+                             [add("times contacted", 1), set_val("rem date", "1/1/2101")], "test.json")
+        jim = mdb.get_client("Jim", "Smith", "test.json")[0]
+
+        self.assertEqual(result["matched"], 2)
+        self.assertEqual((jim["times contacted"], jim["rem date"]), (1, "1/1/2101"))
+        self.assertEqual(mdb.get_client("Mary", "Lou", "test.json")[0]["rem date"], "11/6/2018")
+
+    def test_set_rem_date_for_all(self):
+        mdb.set_rem_date_for_all("1/2/2101", file="test.json")
+        self.assertEqual({client["rem date"] for client in mdb.get_all_db_contents("test.json")}, {"1/2/2101"})
+
+    def tearDown(self):
+        remove_db("test.json")
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        query_cache.clear()
+        mdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com", file="test.json")
+
+    def test_repeated_query_is_cached(self):
+        first = mdb.get_client("Jim", "Smith", "test.json")
+        second = mdb.get_client("Jim", "Smith", file="test.json")
+
+        self.assertEqual(first, second)
+        self.assertEqual(query_cache.stats()["hits"], 1)
+        self.assertEqual(query_cache.stats()["misses"], 1)
+
+    def test_cached_result_is_a_copy(self):
+        mdb.get_client("Jim", "Smith", "test.json")[0]["email"] = None
+        self.assertEqual(mdb.get_client("Jim", "Smith", "test.json")[0]["email"], "jim@smith.com")
+
+    def test_write_invalidates_cache(self):
+        self.assertEqual(mdb.get_times_contacted("Jim", "Smith", file="test.json"), 0)
+        mdb.update_times_contacted("Jim", "Smith", file="test.json")
+        self.assertEqual(len(query_cache), 0)
+        self.assertEqual(mdb.get_times_contacted("Jim", "Smith", file="test.json"), 1)
+
+    def test_hit_does_not_read_db(self):
+        with mock.patch.object(locked_storage.SnapshotJSONStorage, "read", autospec=True,
+                               side_effect=locked_storage.SnapshotJSONStorage.read) as read, \
+                mock.patch("copy.deepcopy") as deepcopy:
+            mdb.get_all_db_contents(file="test.json")
+            reads = read.call_count
+            cached = mdb.get_all_db_contents(file="test.json")
+
+        self.assertGreater(reads, 0)
+        self.assertEqual(read.call_count, reads)
+        self.assertEqual(deepcopy.call_count, 0)
+        self.assertEqual(cached[0]["first name"], "Jim")
+
+    def test_lru_eviction(self):
+        cache = QueryCache(max_entries=2)
+        cache.put(("a",), 1)
+        cache.put(("b",), 2)
+        cache.get(("a",))
+        cache.put(("c",), 3)
+
+        self.assertIsNone(cache.get(("b",)))
+        self.assertEqual(cache.get(("a",)), 1)
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 1, "entries": 2})
+
+    def tearDown(self):
+        remove_db("test.json")
+
+
+class TestPartitionedDb(unittest.TestCase):
+
+    def setUp(self):
+        pdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com", directory="test_partitions")
+        pdb.add_to_db("Mary", "Lou", "3/6/2018", "11/6/2018", "mary@lou.com", directory="test_partitions")
+        pdb.add_to_db("Humpty", "Dumpty", "5/13/2016", "3/2/2100", "humpty@dumpty.com", directory="test_partitions")
+
+    def test_partition_per_month(self):
+        self.assertEqual(sorted(pdb.read_manifest("test_partitions")), ["2018-11", "2019-03", "2100-03"])
+        self.assertEqual(len(pdb.get_all_db_contents("test_partitions")), 3)
+
+    def test_get_due_clients(self):
+        due = pdb.get_due_clients("test_partitions")
+        self.assertEqual(sorted(client.get_first_name() for client in due), ["Jim", "Mary"])
+
+    def test_update_rem_date_moves_client(self):
+        pdb.update_times_contacted("Mary", "Lou", directory="test_partitions")
+        pdb.update_rem_date("Mary", "Lou", "3/30/2100", directory="test_partitions")
+        moved = mdb.get_client("Mary", "Lou", file=os.path.join("test_partitions", "2100-03.json"))
+
+        self.assertEqual(moved[0]["times contacted"], 1)
+        self.assertEqual(mdb.get_all_db_contents(file=os.path.join("test_partitions", "2018-11.json")), [])
+
+    def test_rebalance(self):
+        mdb.update_rem_date("Jim", "Smith", "4/1/2100", file=os.path.join("test_partitions", "2019-03.json"))
+
+        self.assertEqual(pdb.rebalance("test_partitions"), 1)
+        self.assertEqual(sorted(pdb.read_manifest("test_partitions")), ["2018-11", "2019-03", "2100-03", "2100-04"])
+        self.assertEqual(pdb.get_client("Jim", "Smith", "test_partitions")[0]["rem date"], "4/1/2100")
+
+    def test_rebalance_keeps_emptied_partition(self):
+        mdb.update_rem_date("Jim", "Smith", "4/1/2100", file=os.path.join("test_partitions", "2019-03.json"))
+        add_clients = pdb.add_clients
+
+        def add_during_rebalance(*args):
+            pdb.add_to_db("Kim", "Lee", "3/6/2018", "3/25/2019", directory="test_partitions")
+            add_clients(*args)
+
+        with mock.patch("partitioned_db.add_clients", side_effect=add_during_rebalance):
+            pdb.rebalance("test_partitions")
+
+        self.assertEqual(len(pdb.get_client("Kim", "Lee", "test_partitions")), 1)
+        self.assertEqual(len(pdb.get_client("Jim", "Smith", "test_partitions")), 1)
+
+    def test_update_rem_date_keeps_client_if_move_fails(self):
+        with mock.patch("tinydb.database.Table.insert_multiple", side_effect=IOError):
+            with self.assertRaises(IOError):
+                pdb.update_rem_date("Mary", "Lou", "3/30/2100", directory="test_partitions")
+
+        self.assertEqual(pdb.get_client("Mary", "Lou", "test_partitions")[0]["rem date"], "11/6/2018")
+
+    def test_set_rem_date_for_all(self):
+        pdb.set_rem_date_for_all("3/2/2100", directory="test_partitions")
+
+        self.assertEqual(len(mdb.get_all_db_contents(file=os.path.join("test_partitions", "2100-03.json"))), 3)
+        self.assertEqual(len(pdb.get_all_db_contents("test_partitions")), 3)
+
+    def test_split_db_writes_each_partition_once(self):
+        for i in range(30):
+            mdb.add_to_db("Jim{}".format(i), "Smith", "3/12/2017", "{}/21/2019".format(i % 3 + 1), None,
+                          file="test.json")
+        with mock.patch("locked_storage.atomic_write", wraps=locked_storage.atomic_write) as atomic_write, \
+                mock.patch("partitioned_db.write_manifest", wraps=pdb.write_manifest) as write_manifest:
+            self.assertEqual(pdb.split_db("test.json", "test_partitions"), 30)
+
+        self.assertEqual(atomic_write.call_count, 3)
+        self.assertEqual(write_manifest.call_count, 1)
+        self.assertEqual(len(pdb.get_all_db_contents("test_partitions")), 33)
+        remove_db("test.json")
+
+    def tearDown(self):
+        shutil.rmtree("test_partitions")
+
+
+class TestLockedStorage(unittest.TestCase):
+
+    def test_atomic_write_replaces_file(self):
+        locked_storage.atomic_write("test.txt", "first")
+        locked_storage.atomic_write("test.txt", "second")
+        with open("test.txt", "r") as rf:
+            self.assertEqual(rf.read(), "second")
+        os.remove("test.txt")
+
+    def test_snapshot_of_empty_db_does_not_write(self):
+        open("test.json", "w").close()
+        with locked_storage.snapshot_db("test.json") as reader:
+            self.assertEqual(os.path.getsize("test.json"), 0)
+            mdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com", file="test.json")
+            self.assertEqual(len(reader.all()), 1)
+            self.assertRaises(IOError, reader.insert, {"first name": "Mary"})
+
+        with locked_storage.snapshot_db("test.json") as reader:
+            self.assertEqual(len(reader.all()), 1)
+        remove_db("test.json")
+
+    @unittest.skipIf(locked_storage.fcntl is None, "advisory file locks are unavailable")
+    def test_concurrent_writers_lose_nothing(self):
+        result = run_stress_test("test.json", writers=4, readers=2, clients=10)
+
+        self.assertEqual(result["found clients"], result["expected clients"])
+        self.assertEqual(result["found contacts"], result["expected contacts"])
+        self.assertEqual(result["failed reads"], 0)
+        remove_db("test.json")
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        for name, email in (("north", "jim@smith.com"), ("south", None)):
+            directory = os.path.join("test_tenants", name)
+            os.makedirs(directory)
+            with open(os.path.join(directory, "tenant.json"), "w") as wf:
+                json.dump({"sender name": name, "contact number": "123", "sender email": name + "@business.com",
+                           "sender password": "pw", "host address": "localhost", "port number": 465,
+                           "smtp connections": 2}, wf)
+            shutil.copy("message.txt", directory)
+            mdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", email, file=os.path.join(directory, "db.json"))
+            mdb.add_to_db("Mary", "Lou", "3/6/2018", "11/6/2100", email, file=os.path.join(directory, "db.json"))
+
+    def test_discover_tenants(self):
+        self.assertEqual(batch_runner.discover_tenants("test_tenants"),
+                         [os.path.join("test_tenants", "north"), os.path.join("test_tenants", "south")])
+
+    def test_dry_run_all_tenants(self):
+        reports = batch_runner.run_all_tenants("test_tenants", workers=2, dry_run=True)
+
+        self.assertEqual([(report["tenant"], report["due"], report["emailed"]) for report in reports],
+                         [("north", 1, 0), ("south", 1, 0)])
+        self.assertIn("All tenants", batch_runner.format_report(reports, 0.1))
+
+    def test_run_tenant_sends_and_updates(self):
+        with mock.patch("batch_runner.smtplib.SMTP_SSL") as smtp:
+            report = batch_runner.run_tenant(os.path.join("test_tenants", "north"))
+
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(report["emailed"], 1)
+        self.assertEqual(smtp.return_value.sendmail.call_count, 1)
+        self.assertEqual(mdb.get_times_contacted("Jim", "Smith", file=os.path.join("test_tenants", "north", "db.json")),
+                         1)
+
+    def test_rate_limiter(self):
+        limiter = batch_runner.RateLimiter(per_minute=1200)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def tearDown(self):
+        shutil.rmtree("test_tenants")
+
+
+class TestClientReport(unittest.TestCase):
+
+    def setUp(self):
+        mdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com", file="test.json")
+        mdb.add_to_db("Mary", "Lou", "3/6/2018", "11/6/2018", None, file="test.json")
+        mdb.add_to_db("Humpty", "Dumpty", "5/13/2016", "3/2/2019", "humpty@dumpty.com", 2, file="test_archive.json")
+
+    def test_iter_documents_matches_db(self):
+        with mock.patch("client_report.chunk_size", 5):
+            streamed = [client for _, client in client_report.iter_documents("test.json")]
+        self.assertEqual(streamed, mdb.get_all_db_contents("test.json"))
+
+    def test_build_report(self):
+        report = client_report.build_report("test.json", "test_archive.json", "test_state.json")
+
+        self.assertEqual(report["email coverage"], 0.5)
+        self.assertEqual(report["contacts by reminder month"], {"2018-11": 0, "2019-03": 2})
+        self.assertEqual(report["mean days from last visit to reminder"], 492.0)
+
+    def test_archive_stats_are_incremental(self):
+        client_report.build_report("test.json", "test_archive.json", "test_state.json")
+        mdb.add_to_db("Jack", "Horner", "5/13/2016", "3/9/2019", None, 3, file="test_archive.json")
+        report = client_report.build_report("test.json", "test_archive.json", "test_state.json")
+
+        self.assertEqual(report["archived clients"]["clients"], 2)
+        self.assertEqual(report["contacts by reminder month"]["2019-03"], 5)
+        self.assertEqual([(entry["clients"], entry["added"]) for entry in report["archive growth"]], [(2, 2)])
+
+    def test_archive_written_again_is_not_rebuilt(self):
+        client_report.build_report("test.json", "test_archive.json", "test_state.json")
+        mdb.add_to_db("Jack", "Horner", "5/13/2016", "3/9/2019", None, 3, file="test_archive.json")
+        with mock.patch("client_report.ClientStats.add", autospec=True, side_effect=client_report.ClientStats.add) \
+                as add:
+            client_report.build_report("test.json", "test_archive.json", "test_state.json")
+
+        self.assertEqual(add.call_count, 3)  # Two live clients and the newly archived one
+
+    def test_state_of_another_archive_is_not_reused(self):
+        client_report.build_report("test.json", "test_archive.json", "test_state.json")
+        mdb.add_to_db("Jack", "Horner", "5/13/2016", "1/9/2019", None, 3, file="test_other_archive.json")
+        mdb.add_to_db("Jill", "Horner", "5/13/2016", "2/9/2019", None, 1, file="test_other_archive.json")
+        report = client_report.build_report("test.json", "test_other_archive.json", "test_state.json")
+
+        self.assertEqual(report["archived clients"]["contacts_per_month"], {"2019-01": 3, "2019-02": 1})
+        self.assertEqual(len(report["archive growth"]), 1)
+
+    def test_growth_keeps_one_entry_per_day(self):
+        growth = []
+        for day in range(1, 41):
+            client_report.add_growth(growth, day * 2, datetime.date(2019, 1, 1) + datetime.timedelta(days=day))
+        client_report.add_growth(growth, 81, datetime.date(2019, 2, 10))
+
+        self.assertEqual(len(growth), client_report.growth_days)
+        self.assertEqual(growth[-1], {"date": "2019-02-10", "clients": 81, "added": 3})
+
+    def test_full_report_keeps_growth(self):
+        with open("test_state.json", "w") as wf:
+            json.dump({"archive": client_report.archive_identity("test_archive.json"),
+                       "growth": [{"date": "2019-01-01", "clients": 0, "added": 0}]}, wf)
+        report = client_report.build_report("test.json", "test_archive.json", "test_state.json", full=True)
+
+        self.assertEqual([entry["clients"] for entry in report["archive growth"]], [0, 1])
+
+    def tearDown(self):
+        remove_db("test.json", "test_archive.json", "test_other_archive.json", "test_state.json")
+
+
+class TestClientArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.jim = {"first name": "Jim", "last name": "Smith", "last visit": "3/12/2017", "rem date": "3/21/2019",
+                    "email": "jim@smith.com", "times contacted": 2}
+        self.mary = {"first name": "Mary", "last name": "Lou", "last visit": "3/6/2018", "rem date": "11/6/2018",
+                     "email": None, "times contacted": 2}
+
+    def test_segments_rotate_by_month(self):
+        client_archive.append_clients([self.jim], "test_archive", datetime.date(2019, 3, 22))
+        client_archive.append_clients([self.mary], "test_archive", datetime.date(2019, 3, 30))
+        client_archive.append_clients([self.jim], "test_archive", datetime.date(2019, 4, 2))
+        segments = client_archive.read_index("test_archive")
+
+        self.assertEqual([segment["clients"] for segment in segments], [2, 1])
+        self.assertEqual((segments[0]["first archived"], segments[0]["last archived"]), ("2019-03-22", "2019-03-30"))
+        self.assertEqual([client_id for client_id, _ in client_archive.iter_archive("test_archive", after_id=1)],
+                         [2, 3])
+
+    def test_find_archived_client(self):
+        client_archive.append_clients([self.jim, self.mary], "test_archive", datetime.date(2019, 3, 22))
+        found = client_archive.find_archived_client("jim", "smith", "test_archive")
+
+        self.assertEqual([client["archived on"] for client in found], ["3/22/2019"])
+        self.assertEqual(client_archive.find_archived_client("Jack", "Horner", "test_archive"), [])
+
+    def test_convert_archive(self):
+        mdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com", 2, file="test.json")
+        mdb.add_to_db("Mary", "Lou", "3/6/2018", "11/6/2018", None, 2, file="test.json")
+
+        self.assertEqual(client_archive.convert_archive("test.json", "test_archive"), 2)
+        self.assertEqual([segment["month"] for segment in client_archive.read_index("test_archive")],
+                         ["2018-11", "2019-03"])
+
+    def test_convert_archive_twice_is_refused(self):
+        mdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com", 2, file="test.json")
+        client_archive.convert_archive("test.json", "test_archive")
+
+        with self.assertRaises(ValueError):
+            client_archive.convert_archive("test.json", "test_archive")
+        self.assertEqual(client_archive.count_clients("test_archive"), 1)
+        self.assertEqual(client_archive.convert_archive("test.json", "test_archive", force=True), 1)
+        self.assertEqual(client_archive.count_clients("test_archive"), 2)
+
+    def test_append_after_segment_file_is_missing(self):
+        client_archive.append_clients([self.jim], "test_archive", datetime.date(2019, 3, 22))
+        os.remove(os.path.join("test_archive", client_archive.read_index("test_archive")[0]["file"]))
+        client_archive.append_clients([self.mary], "test_archive", datetime.date(2019, 3, 30))
+
+        self.assertEqual([segment["clients"] for segment in client_archive.read_index("test_archive")], [1, 1])
+        archived = client_archive.iter_archive("test_archive", after_id=1)
+        self.assertEqual([client["first name"] for _, client in archived], ["Mary"])
+
+    def test_remove_fully_contacted_clients(self):
+        mdb.add_to_db("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com", 2, file="test.json")
+        mdb.add_to_db("Mary", "Lou", "3/6/2018", "11/6/2018", None, 1, file="test.json")
+        remove_fully_contacted_clients(infile="test.json", outfile="test_archive")
+
+        self.assertEqual([client["first name"] for client in mdb.get_all_db_contents("test.json")], ["Mary"])
+        self.assertEqual(client_archive.count_clients("test_archive"), 1)
+
+    def test_report_reads_only_new_segments(self):
+        client_archive.append_clients([self.jim], "test_archive", datetime.date(2019, 3, 22))
+        client_report.build_report("test.json", "test_archive", "test_state.json")
+        client_archive.append_clients([self.mary], "test_archive", datetime.date(2019, 4, 2))
+        with mock.patch("client_archive._read_segment", wraps=client_archive._read_segment) as read_segment:
+            report = client_report.build_report("test.json", "test_archive", "test_state.json")
+
+        self.assertEqual(read_segment.call_count, 1)
+        self.assertEqual(report["archived clients"]["clients"], 2)
+        self.assertEqual(report["contacts by reminder month"], {"2018-11": 2, "2019-03": 2})
+
+    def tearDown(self):
+        shutil.rmtree("test_archive", ignore_errors=True)
+        remove_db("test.json", "test_state.json")
+
+
+class TestMessageSkeleton(unittest.TestCase):
+
+    def setUp(self):
+        self.skeleton = manage_email.MessageSkeleton("123-456-7890", "Bob")
+
+    def assert_matches_create_message(self, recipient: Client):
+        rendered = self.skeleton.render(recipient, "<1@example.com>")
+        msg = manage_email.create_message([recipient], "123-456-7890", "Bob")[0]
+        msg.set_boundary(self.skeleton.boundary)
+        msg.replace_header("Message-ID", "<1@example.com>")
+        self.assertEqual(rendered, manage_email.flatten_message(msg))
+
+    def test_spliced_email_matches(self):
+        self.assertIsNotNone(self.skeleton.pieces)
+        self.assert_matches_create_message(Client("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com"))
+
+    def test_unspliceable_emails_match(self):
+        self.assert_matches_create_message(Client("José", "Smith", "3/12/2017", "3/21/2019", "jose@smith.com"))
+        self.assert_matches_create_message(Client("From", "Smith", "3/12/2017", "3/21/2019", "from@smith.com"))
+        self.assert_matches_create_message(Client("Jim", "Smith", "3/12/2017", "3/21/2019", "j" * 80 + "@smith.com"))
+
+    def test_render_messages_skips_clients_without_email(self):
+        recipients = [Client("Jim", "Smith", "3/12/2017", "3/21/2019", "jim@smith.com"),
+                      Client("Mary", "Lou", "3/6/2018", "11/6/2018", None)]
+        self.assertEqual(len(manage_email.render_messages(recipients, "123-456-7890", "Bob")), 1)
+
+    def test_benchmark_output_matches(self):
+        result = run_benchmark(make_recipients(200))
+        self.assertEqual(result["matching emails"], 200)
 
 
 class TestAddClient(unittest.TestCase):
@@ -127,7 +569,7 @@ class TestAddClient(unittest.TestCase):
         self.assertFalse(no_output)
         self.assertFalse(bad_email_args)
 
-        os.remove("test.json")
+        remove_db("test.json")
 
 
 class TestAddBulkClients(unittest.TestCase):
@@ -150,7 +592,7 @@ class TestAddBulkClients(unittest.TestCase):
         self.assertEqual(incorrect["Incorrect date formatting"], ['adsf asdf 3/3/2017 asdf', '3 f 3/3/17 1/2/ac'])
         self.assertEqual(incorrect["Date too far in past"], ['c d 1/1/2007'])
         self.assertEqual(incorrect["Email does not contain '@' sign"], ['a b 1/1/18 4/3/18 a.com'])
-        os.remove("test.json")
+        remove_db("test.json")
         os.remove("test.txt")
 
 